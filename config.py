@@ -28,6 +28,8 @@ DEFAULT_PAIRS = [
 # ============================================================
 TIMEFRAME = '1h'  # Фиксированный таймфрейм (1 час)
 CANDLE_SECONDS = 3600  # 1 час = 3600 секунд
+MIN_DEPTH = {'1h': 100, '4h': 50, '1d': 30}  # Минимум свечей по ТФ для анализа пары
+HISTORY_DEPTH = {'1h': 100, '4h': 100, '1d': 30}  # Свечей загружаем при старте (по 4h ищутся уровни - берём больше минимума)
 
 # ============================================================
 # ANALYSIS SETTINGS
@@ -48,12 +50,24 @@ MIN_VOLATILITY = 0.3  # Минимальная волатильность в п
 MAX_SIGNALS_PER_DAY = 10  # Максимум сигналов в день на одну пару
 BATCH_SEND_SIZE = 10  # Размер батча при массовой рассылке
 BATCH_SEND_DELAY = 0.05  # Задержка между отправками в секундах
+ANALYZER_CONCURRENCY = 20  # Максимум пар, анализируемых одновременно
+TELEGRAM_RATE_LIMIT = 30  # Лимит Telegram на отправку сообщений в секунду
+SEND_CONCURRENCY = 30  # Максимум одновременных отправок при рассылке сигнала
+ANALYZER_WORKERS = 4  # Процессов для анализа пар (вне event loop)
 
 # ============================================================
 # DATABASE
 # ============================================================
 DATABASE_FILE = 'cryptomicky.db'
 DB_PATH = DATABASE_FILE  # Алиас для совместимости с database.py
+DB_POOL_SIZE = 5  # Количество соединений для чтения в пуле
+DB_CHECKPOINT_INTERVAL = 60  # Интервал чекпоинта WAL (секунды)
+DB_CACHED_STATEMENTS = 256  # Размер кэша подготовленных выражений на соединение
+SIGNAL_FLUSH_BATCH = 500  # Максимум сигналов в одной транзакции записи
+SIGNAL_FLUSH_INTERVAL = 0.05  # Окно накопления сигналов перед записью (секунды)
+SIGNAL_FLUSH_RETRIES = 3  # Попыток записи пачки сигналов при ошибке БД
+SUBSCRIPTION_CACHE_SIZE = 10000  # Максимум пользователей в кэше подписок
+SUBSCRIPTION_CACHE_TTL = 30  # Время жизни записи в кэше подписок (секунды)
 
 # ============================================================
 # TECHNICAL INDICATORS SETTINGS
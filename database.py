@@ -1,224 +1,586 @@
-"""
-database.py - Работа с базой данных
-"""
-import time
-import asyncio
-import logging
-from typing import List
-from datetime import datetime, timedelta
-import aiosqlite
-
-from config import DB_PATH
-
-logger = logging.getLogger(__name__)
-
-# ==================== SQL SCHEMA ====================
-INIT_SQL = """
-PRAGMA journal_mode=WAL;
-PRAGMA synchronous=NORMAL;
-PRAGMA cache_size=10000;
-PRAGMA temp_store=MEMORY;
-
-CREATE TABLE IF NOT EXISTS users (
-    user_id INTEGER PRIMARY KEY,
-    username TEXT,
-    created_at INTEGER DEFAULT (strftime('%s', 'now')),
-    subscription_until INTEGER DEFAULT 0
-);
-
-CREATE TABLE IF NOT EXISTS tracked_pairs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    pair TEXT NOT NULL,
-    added_at INTEGER DEFAULT (strftime('%s', 'now')),
-    UNIQUE(user_id, pair),
-    FOREIGN KEY (user_id) REFERENCES users(user_id)
-);
-
-CREATE TABLE IF NOT EXISTS signals (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    pair TEXT NOT NULL,
-    side TEXT NOT NULL,
-    price REAL NOT NULL,
-    confidence INTEGER NOT NULL,
-    sent_at INTEGER DEFAULT (strftime('%s', 'now')),
-    FOREIGN KEY (user_id) REFERENCES users(user_id)
-);
-
-CREATE INDEX IF NOT EXISTS idx_tracked_pairs_user ON tracked_pairs(user_id);
-CREATE INDEX IF NOT EXISTS idx_tracked_pairs_pair ON tracked_pairs(pair);
-CREATE INDEX IF NOT EXISTS idx_signals_user ON signals(user_id);
-CREATE INDEX IF NOT EXISTS idx_signals_pair ON signals(pair);
-CREATE INDEX IF NOT EXISTS idx_signals_sent ON signals(sent_at);
-"""
-
-# ==================== БАЗА ДАННЫХ ====================
-
-async def init_db():
-    """Инициализация базы данных"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.executescript(INIT_SQL)
-        await db.commit()
-    logger.info("✅ Database initialized")
-
-# ==================== ПОЛЬЗОВАТЕЛИ ====================
-
-async def add_user(user_id: int, username: str = None):
-    """Добавить пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)",
-            (user_id, username)
-        )
-        await db.commit()
-
-async def get_user_subscription(user_id: int) -> int:
-    """Получить дату окончания подписки (timestamp)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT subscription_until FROM users WHERE user_id = ?",
-            (user_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else 0
-
-async def update_subscription(user_id: int, days: int):
-    """Обновить подписку (добавить дни)"""
-    current_time = int(time.time())
-    
-    # Получаем текущую подписку
-    current_sub = await get_user_subscription(user_id)
-    
-    # Если подписка активна, добавляем к ней, иначе от текущего времени
-    if current_sub > current_time:
-        new_sub = current_sub + (days * 86400)
-    else:
-        new_sub = current_time + (days * 86400)
-    
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Добавляем пользователя если его нет
-        await db.execute(
-            "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
-            (user_id,)
-        )
-        # Обновляем подписку
-        await db.execute(
-            "UPDATE users SET subscription_until = ? WHERE user_id = ?",
-            (new_sub, user_id)
-        )
-        await db.commit()
-    
-    logger.info(f"✅ User {user_id} subscription updated: +{days} days")
-
-async def is_user_subscribed(user_id: int) -> bool:
-    """Проверить активна ли подписка"""
-    sub_until = await get_user_subscription(user_id)
-    current_time = int(time.time())
-    return sub_until > current_time
-
-# ==================== ОТСЛЕЖИВАЕМЫЕ ПАРЫ ====================
-
-async def get_user_pairs(user_id: int) -> List[str]:
-    """Получить все пары пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT pair FROM tracked_pairs WHERE user_id = ? ORDER BY added_at",
-            (user_id,)
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
-
-async def add_tracked_pair(user_id: int, pair: str) -> bool:
-    """Добавить пару для отслеживания"""
-    try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute(
-                "INSERT INTO tracked_pairs (user_id, pair) VALUES (?, ?)",
-                (user_id, pair)
-            )
-            await db.commit()
-        return True
-    except aiosqlite.IntegrityError:
-        return False  # Уже есть
-
-async def remove_tracked_pair(user_id: int, pair: str) -> bool:
-    """Удалить пару из отслеживания"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "DELETE FROM tracked_pairs WHERE user_id = ? AND pair = ?",
-            (user_id, pair)
-        )
-        await db.commit()
-        return cursor.rowcount > 0
-
-async def get_all_tracked_pairs() -> List[str]:
-    """Получить все уникальные отслеживаемые пары"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT DISTINCT pair FROM tracked_pairs") as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
-
-async def get_pairs_with_users():
-    """Получить пары с пользователями которые их отслеживают"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            """
-            SELECT tp.pair, tp.user_id 
-            FROM tracked_pairs tp
-            JOIN users u ON tp.user_id = u.user_id
-            WHERE u.subscription_until > strftime('%s', 'now')
-            """
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [{"pair": row[0], "user_id": row[1]} for row in rows]
-
-# ==================== СИГНАЛЫ ====================
-
-async def count_signals_today(pair: str) -> int:
-    """Подсчитать количество сигналов сегодня для пары"""
-    today_start = int(time.time()) - 86400  # 24 часа назад
-    
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT COUNT(*) FROM signals WHERE pair = ? AND sent_at > ?",
-            (pair, today_start)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else 0
-
-async def log_signal(user_id: int, pair: str, side: str, price: float, confidence: int):
-    """Записать отправленный сигнал"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO signals (user_id, pair, side, price, confidence) VALUES (?, ?, ?, ?, ?)",
-            (user_id, pair, side, price, confidence)
-        )
-        await db.commit()
-
-# ==================== СТАТИСТИКА ====================
-
-async def get_all_user_ids() -> List[int]:
-    """Получить все ID пользователей"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT user_id FROM users") as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
-
-async def get_users_count() -> int:
-    """Получить количество пользователей"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT COUNT(*) FROM users") as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else 0
-
-async def get_subscribed_users_count() -> int:
-    """Получить количество пользователей с активной подпиской"""
-    current_time = int(time.time())
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT COUNT(*) FROM users WHERE subscription_until > ?",
-            (current_time,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else 0
+"""
+database.py - Работа с базой данных
+"""
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import aiosqlite
+
+from config import (
+    DB_PATH, DB_POOL_SIZE, DB_CHECKPOINT_INTERVAL, DB_CACHED_STATEMENTS,
+    SIGNAL_FLUSH_BATCH, SIGNAL_FLUSH_INTERVAL, SIGNAL_FLUSH_RETRIES,
+    SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL, DEFAULT_PROMO_CODES
+)
+
+logger = logging.getLogger(__name__)
+
+# ==================== SQL SCHEMA ====================
+# Прагмы на соединение: все кроме journal_mode действуют только
+# на то соединение, где выполнены, поэтому ставим их на каждое.
+# Выполняются по одной через execute() вне транзакции - внутри
+# executescript journal_mode=WAL может молча не включиться
+PRAGMA_SQL = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-32000;
+PRAGMA busy_timeout=5000;
+PRAGMA mmap_size=268435456;
+"""
+
+# Схема: выполняется один раз при старте
+DDL_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    created_at INTEGER DEFAULT (strftime('%s', 'now')),
+    subscription_until INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS tracked_pairs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    pair TEXT NOT NULL COLLATE BINARY CHECK (pair = upper(pair)),
+    added_at INTEGER DEFAULT (strftime('%s', 'now')),
+    UNIQUE(user_id, pair),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    pair TEXT NOT NULL,
+    side TEXT NOT NULL,
+    price REAL NOT NULL,
+    confidence INTEGER NOT NULL,
+    sent_at INTEGER DEFAULT (strftime('%s', 'now')),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS promos (
+    code TEXT PRIMARY KEY,
+    days INTEGER NOT NULL,
+    expires_at INTEGER,        -- NULL = бессрочный
+    uses_remaining INTEGER     -- NULL = без лимита активаций
+);
+
+-- Счётчики, поддерживаемые триггерами: COUNT(*) по растущим таблицам не нужен
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO stats (key, value) SELECT 'users_count', COUNT(*) FROM users;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_insert AFTER INSERT ON users BEGIN
+    UPDATE stats SET value = value + 1 WHERE key = 'users_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_delete AFTER DELETE ON users BEGIN
+    UPDATE stats SET value = value - 1 WHERE key = 'users_count';
+END;
+
+CREATE INDEX IF NOT EXISTS idx_users_sub ON users(subscription_until);
+CREATE INDEX IF NOT EXISTS idx_tracked_pairs_user ON tracked_pairs(user_id);
+-- (pair, user_id) покрывает выборку подписчиков с GROUP BY pair и заменяет индекс по pair
+CREATE INDEX IF NOT EXISTS idx_tracked_pair_user ON tracked_pairs(pair, user_id);
+DROP INDEX IF EXISTS idx_tracked_pairs_pair;
+CREATE INDEX IF NOT EXISTS idx_signals_user ON signals(user_id);
+CREATE INDEX IF NOT EXISTS idx_signals_pair ON signals(pair);
+CREATE INDEX IF NOT EXISTS idx_signals_sent ON signals(sent_at);
+"""
+
+# ==================== ПУЛ СОЕДИНЕНИЙ ====================
+
+class DBPool:
+    """Пул постоянных соединений с SQLite: N читателей + один писатель"""
+
+    def __init__(self, path: str, pool_size: int = 5):
+        self.path = path
+        self.pool_size = pool_size
+        self._connections: List[aiosqlite.Connection] = []
+        self._available: asyncio.Queue = None
+        self._writer: aiosqlite.Connection = None
+        self._write_lock: asyncio.Lock = None
+        self._checkpoint_task: asyncio.Task = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        # sqlite3 переиспользует подготовленные выражения по тексту SQL;
+        # кэш должен вмещать все горячие запросы, иначе они вытесняются
+        conn = await aiosqlite.connect(self.path, cached_statements=DB_CACHED_STATEMENTS)
+        for pragma in PRAGMA_SQL.split(";"):
+            if pragma.strip():
+                await conn.execute(pragma)
+        self._connections.append(conn)
+        return conn
+
+    async def init(self):
+        """Открыть соединения пула"""
+        self._available = asyncio.Queue()
+        for _ in range(self.pool_size):
+            self._available.put_nowait(await self._connect())
+        
+        # SQLite допускает одного писателя: держим для него отдельное
+        # соединение, а чекпоинт WAL делаем сами по таймеру
+        self._writer = await self._connect()
+        await self._writer.execute("PRAGMA wal_autocheckpoint=0")
+        
+        async with self._writer.execute("PRAGMA journal_mode") as cursor:
+            journal_mode = (await cursor.fetchone())[0]
+        if journal_mode != "wal":
+            logger.warning(f"⚠️ SQLite journal_mode={journal_mode}, WAL is not active")
+        self._write_lock = asyncio.Lock()
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Взять соединение для чтения"""
+        return await self._available.get()
+
+    async def release(self, conn: aiosqlite.Connection):
+        """Вернуть соединение для чтения"""
+        self._available.put_nowait(conn)
+
+    async def acquire_writer(self) -> aiosqlite.Connection:
+        """Взять соединение для записи (эксклюзивно)"""
+        await self._write_lock.acquire()
+        return self._writer
+
+    async def release_writer(self, conn: aiosqlite.Connection):
+        """Вернуть соединение для записи"""
+        self._write_lock.release()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Транзакция на соединении записи: BEGIN IMMEDIATE ... один COMMIT"""
+        conn = await self.acquire_writer()
+        try:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+        finally:
+            await self.release_writer(conn)
+
+    async def _checkpoint_loop(self):
+        """Периодический чекпоинт WAL вне пользовательских запросов"""
+        while True:
+            await asyncio.sleep(DB_CHECKPOINT_INTERVAL)
+            conn = await self.acquire_writer()
+            try:
+                await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e:
+                logger.error(f"WAL checkpoint error: {e}")
+            finally:
+                await self.release_writer(conn)
+
+    async def close(self):
+        """Закрыть все соединения"""
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+
+db_pool = DBPool(DB_PATH, DB_POOL_SIZE)
+
+# Время с точностью до секунды: обновляется фоновой задачей,
+# чтобы горячие пути не дёргали time.time() на каждом вызове
+_now: int = 0
+_clock_task: asyncio.Task = None
+
+# LRU-кэш дат окончания подписки {user_id: (cached_at, subscription_until)}:
+# подписку проверяет почти каждый хендлер, а меняется она только здесь;
+# TTL страхует от правок базы в обход update_subscription
+_sub_cache: "OrderedDict[int, Tuple[int, int]]" = OrderedDict()
+
+# Все отслеживаемые пары (None - ещё не загружены): меняются редко,
+# а сборщик цен спрашивает их каждый цикл
+_tracked_pairs: set = None
+
+# Очередь отправленных сигналов: пишется пачками фоновой задачей
+_signal_queue: asyncio.Queue = None
+_flusher_task: asyncio.Task = None
+# Метка в очереди: флашер дописывает всё до неё и завершается
+_FLUSH_STOP = None
+
+def now_ts() -> int:
+    """Текущий unix timestamp (кэшированный)"""
+    return _now or int(time.time())
+
+async def _clock_loop():
+    """Фоновая задача: обновляет кэшированное время раз в секунду"""
+    global _now
+    while True:
+        _now = int(time.time())
+        await asyncio.sleep(1)
+
+# ==================== БАЗА ДАННЫХ ====================
+
+async def init_db():
+    """Инициализация базы данных"""
+    await db_pool.init()
+    conn = await db_pool.acquire_writer()
+    try:
+        await conn.executescript(DDL_SQL)
+        # Встроенные промокоды из config (существующие не трогаем)
+        await conn.executemany(
+            "INSERT OR IGNORE INTO promos (code, days) VALUES (?, ?)",
+            DEFAULT_PROMO_CODES.items()
+        )
+        # Статистика для планировщика: иначе он не выберет покрывающие индексы
+        await conn.execute("ANALYZE")
+        await conn.commit()
+    finally:
+        await db_pool.release_writer(conn)
+    
+    global _signal_queue, _flusher_task, _clock_task
+    _clock_task = asyncio.create_task(_clock_loop())
+    _signal_queue = asyncio.Queue()
+    _flusher_task = asyncio.create_task(_signal_flusher())
+    logger.info("✅ Database initialized")
+
+async def close_db():
+    """Дописать очередь сигналов и закрыть пул соединений"""
+    if _clock_task:
+        _clock_task.cancel()
+    if _flusher_task:
+        # Не отменяем: флашер допишет пачку на руках и всё, что стоит до метки
+        _signal_queue.put_nowait(_FLUSH_STOP)
+        await _flusher_task
+    await db_pool.close()
+
+# ==================== ПОЛЬЗОВАТЕЛИ ====================
+
+async def add_user(user_id: int, username: str = None):
+    """Добавить пользователя"""
+    async with db_pool.transaction() as conn:
+        await conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)",
+            (user_id, username)
+        )
+
+def _cache_subscription(user_id: int, sub_until: int):
+    """Положить дату окончания подписки в LRU-кэш"""
+    _sub_cache[user_id] = (now_ts(), sub_until)
+    _sub_cache.move_to_end(user_id)
+    if len(_sub_cache) > SUBSCRIPTION_CACHE_SIZE:
+        _sub_cache.popitem(last=False)
+
+async def get_user_subscription(user_id: int) -> int:
+    """Получить дату окончания подписки (timestamp)"""
+    cached = _sub_cache.get(user_id)
+    if cached is not None and now_ts() - cached[0] < SUBSCRIPTION_CACHE_TTL:
+        _sub_cache.move_to_end(user_id)
+        return cached[1]
+    
+    conn = await db_pool.acquire()
+    try:
+        async with conn.execute(
+            "SELECT subscription_until FROM users WHERE user_id = ?",
+            (user_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+    finally:
+        await db_pool.release(conn)
+    
+    sub_until = row[0] if row else 0
+    _cache_subscription(user_id, sub_until)
+    return sub_until
+
+async def _extend_subscription(conn: aiosqlite.Connection, user_id: int, days: int) -> int:
+    """Продлить подписку внутри транзакции, вернуть новую дату окончания"""
+    # Если подписка активна, добавляем к ней, иначе от текущего времени;
+    # чтение, решение и запись - один атомарный запрос
+    seconds = days * 86400
+    async with conn.execute(
+        """
+        INSERT INTO users (user_id, subscription_until)
+        VALUES (?, strftime('%s', 'now') + ?)
+        ON CONFLICT(user_id) DO UPDATE SET subscription_until = CASE
+            WHEN subscription_until > strftime('%s', 'now') THEN subscription_until + ?
+            ELSE excluded.subscription_until
+        END
+        RETURNING subscription_until
+        """,
+        (user_id, seconds, seconds)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return row[0]
+
+async def update_subscription(user_id: int, days: int) -> int:
+    """Обновить подписку (добавить дни), вернуть новую дату окончания"""
+    async with db_pool.transaction() as conn:
+        sub_until = await _extend_subscription(conn, user_id, days)
+    
+    _cache_subscription(user_id, sub_until)
+    logger.info(f"✅ User {user_id} subscription updated: +{days} days")
+    return sub_until
+
+async def redeem_promo(user_id: int, code: str) -> Optional[int]:
+    """Активировать промокод: вернуть число дней или None если код недействителен"""
+    async with db_pool.transaction() as conn:
+        async with conn.execute(
+            """
+            SELECT days FROM promos
+            WHERE code = ?
+              AND (expires_at IS NULL OR expires_at > strftime('%s', 'now'))
+              AND (uses_remaining IS NULL OR uses_remaining > 0)
+            """,
+            (code,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        
+        days = row[0]
+        await conn.execute(
+            "UPDATE promos SET uses_remaining = uses_remaining - 1 "
+            "WHERE code = ? AND uses_remaining IS NOT NULL",
+            (code,)
+        )
+        sub_until = await _extend_subscription(conn, user_id, days)
+    
+    _cache_subscription(user_id, sub_until)
+    return days
+
+async def is_user_subscribed(user_id: int) -> bool:
+    """Проверить активна ли подписка"""
+    sub_until = await get_user_subscription(user_id)
+    current_time = now_ts()
+    return sub_until > current_time
+
+# ==================== ОТСЛЕЖИВАЕМЫЕ ПАРЫ ====================
+
+async def get_user_pairs(user_id: int) -> List[str]:
+    """Получить все пары пользователя"""
+    conn = await db_pool.acquire()
+    try:
+        rows = await conn.execute_fetchall(
+            "SELECT pair FROM tracked_pairs WHERE user_id = ? ORDER BY added_at",
+            (user_id,)
+        )
+        return [row[0] for row in rows]
+    finally:
+        await db_pool.release(conn)
+
+async def add_tracked_pair(user_id: int, pair: str) -> bool:
+    """Добавить пару для отслеживания (pair уже в верхнем регистре)"""
+    try:
+        async with db_pool.transaction() as conn:
+            await conn.execute(
+                "INSERT INTO tracked_pairs (user_id, pair) VALUES (?, ?)",
+                (user_id, pair)
+            )
+        if _tracked_pairs is not None:
+            _tracked_pairs.add(pair)
+        return True
+    except aiosqlite.IntegrityError:
+        return False  # Уже есть
+
+async def add_tracked_pairs(user_id: int, pairs: List[str]) -> int:
+    """Добавить несколько пар одной транзакцией (вернуть число новых)"""
+    async with db_pool.transaction() as conn:
+        cursor = await conn.executemany(
+            "INSERT OR IGNORE INTO tracked_pairs (user_id, pair) VALUES (?, ?)",
+            [(user_id, pair) for pair in pairs]
+        )
+    if _tracked_pairs is not None:
+        _tracked_pairs.update(pairs)
+    return cursor.rowcount
+
+async def remove_tracked_pair(user_id: int, pair: str) -> bool:
+    """Удалить пару из отслеживания"""
+    async with db_pool.transaction() as conn:
+        cursor = await conn.execute(
+            "DELETE FROM tracked_pairs WHERE user_id = ? AND pair = ?",
+            (user_id, pair)
+        )
+        removed = cursor.rowcount > 0
+        
+        # Пару убираем из общего множества, только если её больше никто не отслеживает
+        last_tracker = False
+        if removed and _tracked_pairs is not None:
+            async with conn.execute(
+                "SELECT 1 FROM tracked_pairs WHERE pair = ? LIMIT 1", (pair,)
+            ) as cursor:
+                last_tracker = await cursor.fetchone() is None
+    # Множество меняем только после успешного COMMIT, как в add_tracked_pair
+    if last_tracker:
+        _tracked_pairs.discard(pair)
+    return removed
+
+async def get_all_tracked_pairs() -> List[str]:
+    """Получить все уникальные отслеживаемые пары"""
+    global _tracked_pairs
+    if _tracked_pairs is None:
+        # Загрузка на соединении записи: пока читаем, add/remove ждут блокировку
+        # и не могут пройти мимо множества, которое ещё не создано
+        conn = await db_pool.acquire_writer()
+        try:
+            if _tracked_pairs is None:
+                rows = await conn.execute_fetchall("SELECT DISTINCT pair FROM tracked_pairs")
+                _tracked_pairs = {row[0] for row in rows}
+        finally:
+            await db_pool.release_writer(conn)
+    return list(_tracked_pairs)
+
+async def get_pairs_with_users() -> Dict[str, Tuple[int, ...]]:
+    """Получить пары с пользователями которые их отслеживают: {pair: (user_id, ...)}"""
+    conn = await db_pool.acquire()
+    try:
+        rows = await conn.execute_fetchall(
+            """
+            SELECT tp.pair, group_concat(tp.user_id)
+            FROM tracked_pairs tp
+            JOIN users u ON tp.user_id = u.user_id
+            WHERE u.subscription_until > strftime('%s', 'now')
+            GROUP BY tp.pair
+            """
+        )
+    finally:
+        await db_pool.release(conn)
+    
+    return {pair: tuple(map(int, user_ids.split(","))) for pair, user_ids in rows}
+
+# ==================== СИГНАЛЫ ====================
+
+async def count_signals_today(pair: str) -> int:
+    """Подсчитать количество сигналов сегодня для пары"""
+    conn = await db_pool.acquire()
+    try:
+        # 24 часа назад
+        async with conn.execute(
+            "SELECT COUNT(*) FROM signals WHERE pair = ? AND sent_at > strftime('%s', 'now') - 86400",
+            (pair,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    finally:
+        await db_pool.release(conn)
+
+async def count_signals_today_bulk(pairs: List[str]) -> Dict[str, int]:
+    """Подсчитать количество сигналов сегодня сразу для нескольких пар"""
+    if not pairs:
+        return {}
+    
+    placeholders = ",".join("?" * len(pairs))
+    
+    conn = await db_pool.acquire()
+    try:
+        rows = await conn.execute_fetchall(
+            f"SELECT pair, COUNT(*) FROM signals "
+            f"WHERE sent_at > strftime('%s', 'now') - 86400 "  # 24 часа назад
+            f"AND pair IN ({placeholders}) GROUP BY pair",
+            pairs
+        )
+    finally:
+        await db_pool.release(conn)
+    
+    counts = dict.fromkeys(pairs, 0)
+    counts.update(rows)
+    return counts
+
+async def get_last_signal_times(since_seconds: int) -> Dict[str, int]:
+    """Время последнего сигнала по каждой паре за последние since_seconds: {pair: sent_at}"""
+    conn = await db_pool.acquire()
+    try:
+        rows = await conn.execute_fetchall(
+            "SELECT pair, MAX(sent_at) FROM signals "
+            "WHERE sent_at > strftime('%s', 'now') - ? GROUP BY pair",
+            (since_seconds,)
+        )
+    finally:
+        await db_pool.release(conn)
+    
+    return dict(rows)
+
+async def log_signal(user_id: int, pair: str, side: str, price: float, confidence: int):
+    """Записать отправленный сигнал (через очередь фоновой записи)"""
+    await _signal_queue.put((user_id, pair, side, price, confidence))
+
+async def log_signals(rows: List[tuple]):
+    """Записать сигналы рассылки пачкой: (user_id, pair, side, price, confidence)"""
+    for row in rows:
+        await _signal_queue.put(row)
+
+async def _write_signals(batch: List[tuple]):
+    """Записать пачку сигналов одной транзакцией"""
+    async with db_pool.transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO signals (user_id, pair, side, price, confidence) VALUES (?, ?, ?, ?, ?)",
+            batch
+        )
+
+async def _flush_signals(batch: List[tuple]):
+    """Записать пачку сигналов, повторяя при ошибке БД"""
+    for attempt in range(1, SIGNAL_FLUSH_RETRIES + 1):
+        try:
+            await _write_signals(batch)
+            return
+        except Exception as e:
+            logger.error(f"Signal flush error ({len(batch)} rows, attempt {attempt}/{SIGNAL_FLUSH_RETRIES}): {e}")
+            if attempt < SIGNAL_FLUSH_RETRIES:
+                await asyncio.sleep(attempt)
+    logger.error(f"Dropped {len(batch)} signal rows after {SIGNAL_FLUSH_RETRIES} failed writes")
+
+async def _signal_flusher():
+    """Фоновая задача: собирает сигналы за короткое окно и пишет их пачкой"""
+    stopping = False
+    while not stopping:
+        row = await _signal_queue.get()
+        if row is _FLUSH_STOP:
+            break
+        batch = [row]
+        await asyncio.sleep(SIGNAL_FLUSH_INTERVAL)
+        while len(batch) < SIGNAL_FLUSH_BATCH and not _signal_queue.empty():
+            row = _signal_queue.get_nowait()
+            if row is _FLUSH_STOP:
+                stopping = True
+                break
+            batch.append(row)
+        
+        await _flush_signals(batch)
+
+# ==================== СТАТИСТИКА ====================
+
+async def iter_all_user_ids(chunk: int = 1000) -> AsyncIterator[int]:
+    """Перебрать ID всех пользователей, читая из базы порциями"""
+    conn = await db_pool.acquire()
+    try:
+        async with conn.execute("SELECT user_id FROM users") as cursor:
+            while True:
+                rows = await cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[0]
+    finally:
+        await db_pool.release(conn)
+
+async def get_users_count() -> int:
+    """Получить количество пользователей"""
+    conn = await db_pool.acquire()
+    try:
+        async with conn.execute("SELECT value FROM stats WHERE key = 'users_count'") as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    finally:
+        await db_pool.release(conn)
+
+async def get_subscribed_users_count() -> int:
+    """Получить количество пользователей с активной подпиской"""
+    conn = await db_pool.acquire()
+    try:
+        async with conn.execute(
+            "SELECT COUNT(*) FROM users WHERE subscription_until > strftime('%s', 'now')"
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    finally:
+        await db_pool.release(conn)
@@ -9,13 +9,19 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from config import ADMIN_IDS, DEFAULT_PAIRS
 from database import (
-    update_subscription,
-    add_tracked_pair, remove_tracked_pair, get_user_pairs,
+    redeem_promo,
+    add_tracked_pair, add_tracked_pairs, remove_tracked_pair, get_user_pairs,
     is_user_subscribed
 )
+from limits import TELEGRAM_LIMITER
 
 logger = logging.getLogger(__name__)
 
+async def safe_answer(message: types.Message, *args, **kwargs):
+    """Ответ пользователю через общий лимитер отправки бота"""
+    async with TELEGRAM_LIMITER:
+        return await message.answer(*args, **kwargs)
+
 # FSM States
 class PromoState(StatesGroup):
     waiting_for_promo = State()
@@ -56,7 +62,7 @@ async def cmd_start(message: types.Message):
         )
     
     keyboard = get_main_menu(is_subscribed)
-    await message.answer(text, reply_markup=keyboard)
+    await safe_answer(message, text, reply_markup=keyboard)
 
 def get_main_menu(is_subscribed: bool) -> InlineKeyboardMarkup:
     """Главное меню"""
@@ -175,19 +181,10 @@ async def process_promo(message: types.Message, state: FSMContext):
     promo_code = message.text.strip().upper()
     user_id = message.from_user.id
     
-    # Проверка промокода
-    valid_promos = {
-        "START2024": 30,
-        "CRYPTO50": 7,
-        "WELCOME": 14
-    }
+    # Проверка промокода и активация подписки - одной транзакцией
+    days = await redeem_promo(user_id, promo_code)
     
-    if promo_code in valid_promos:
-        days = valid_promos[promo_code]
-        
-        # Активируем подписку
-        await update_subscription(user_id, days)
-        
+    if days is not None:
         text = (
             f"✅ <b>Промокод активирован!</b>\n\n"
             f"🎁 Код: {promo_code}\n"
@@ -210,7 +207,7 @@ async def process_promo(message: types.Message, state: FSMContext):
         InlineKeyboardButton("« Главное меню", callback_data="back_to_menu")
     )
     
-    await message.answer(text, reply_markup=keyboard)
+    await safe_answer(message, text, reply_markup=keyboard)
     await state.finish()
 
 # ============================================================
@@ -245,7 +242,8 @@ async def process_support(message: types.Message, state: FSMContext):
     
     for admin_id in ADMIN_IDS:
         try:
-            await message.bot.send_message(admin_id, admin_text)
+            async with TELEGRAM_LIMITER:
+                await message.bot.send_message(admin_id, admin_text)
         except Exception as e:
             logger.error(f"Failed to send support message to admin {admin_id}: {e}")
     
@@ -259,7 +257,7 @@ async def process_support(message: types.Message, state: FSMContext):
         InlineKeyboardButton("« Главное меню", callback_data="back_to_menu")
     )
     
-    await message.answer(text, reply_markup=keyboard)
+    await safe_answer(message, text, reply_markup=keyboard)
     await state.finish()
     
     logger.info(f"💬 Support message from {user_id}: {support_msg[:50]}...")
@@ -328,11 +326,12 @@ async def cmd_cancel(message: types.Message, state: FSMContext):
     current_state = await state.get_state()
     
     if current_state is None:
-        await message.answer("Нечего отменять")
+        await safe_answer(message, "Нечего отменять")
         return
     
     await state.finish()
-    await message.answer(
+    await safe_answer(
+        message,
         "✅ Действие отменено\n\nИспользуйте /start для главного меню"
     )
 
@@ -340,12 +339,43 @@ async def cmd_cancel(message: types.Message, state: FSMContext):
 # КОМАНДЫ УПРАВЛЕНИЯ МОНЕТАМИ
 # ============================================================
 
+# Статичные тексты собираем один раз при импорте
+_ADD_USAGE = (
+    f"Используйте: /add СИМВОЛ\n\n"
+    f"Примеры:\n"
+    f"/add BTCUSDT\n"
+    f"/add ETHUSDT\n"
+    f"/add BTC ETH SOL — несколько сразу\n\n"
+    f"Доступные пары:\n{', '.join(DEFAULT_PAIRS[:10])}..."
+)
+
+_HELP_TEXT = (
+    "📚 <b>Справка</b>\n\n"
+    "<b>Основные команды:</b>\n"
+    "/start — главное меню\n"
+    "/add СИМВОЛ — добавить монету\n"
+    "/remove СИМВОЛ — удалить монету\n"
+    "/list — список ваших монет\n"
+    "/cancel — отменить действие\n\n"
+    "<b>Оплата:</b>\n"
+    "💳 Через @CryptoBot (USDT)\n"
+    "🎁 Промокоды для бесплатного доступа\n\n"
+    "<b>Поддержка:</b>\n"
+    "💬 Кнопка \"Связь с нами\" в меню"
+)
+
+def _normalize_pair(symbol: str) -> str:
+    """Привести ввод пользователя к паре Binance: btc -> BTCUSDT"""
+    symbol = symbol.strip().upper()
+    return symbol if symbol.endswith("USDT") else f"{symbol}USDT"
+
 async def cmd_add(message: types.Message):
     """Добавить монету"""
     user_id = message.from_user.id
     
     if not await is_user_subscribed(user_id):
-        await message.answer(
+        await safe_answer(
+            message,
             "⚠️ У вас нет активной подписки\n\n"
             "Используйте /start для оплаты"
         )
@@ -353,26 +383,25 @@ async def cmd_add(message: types.Message):
     
     args = message.get_args()
     if not args:
-        pairs_list = ", ".join(DEFAULT_PAIRS[:10])
-        await message.answer(
-            f"Используйте: /add СИМВОЛ\n\n"
-            f"Примеры:\n"
-            f"/add BTCUSDT\n"
-            f"/add ETHUSDT\n\n"
-            f"Доступные пары:\n{pairs_list}..."
-        )
+        await safe_answer(message, _ADD_USAGE)
         return
     
-    pair = args.upper()
-    if not pair.endswith("USDT"):
-        pair = f"{pair}USDT"
+    pairs = [_normalize_pair(symbol) for symbol in args.split()]
+    
+    # Несколько монет - одной транзакцией
+    if len(pairs) > 1:
+        added = await add_tracked_pairs(user_id, pairs)
+        await safe_answer(message, f"✅ Добавлено: {added} из {len(pairs)}\n\n" + ", ".join(pairs))
+        logger.info(f"➕ User {user_id} added pairs: {pairs}")
+        return
     
+    pair = pairs[0]
     success = await add_tracked_pair(user_id, pair)
     if success:
-        await message.answer(f"✅ Добавлено: {pair}")
+        await safe_answer(message, f"✅ Добавлено: {pair}")
         logger.info(f"➕ User {user_id} added pair: {pair}")
     else:
-        await message.answer(f"⚠️ {pair} уже в вашем списке")
+        await safe_answer(message, f"⚠️ {pair} уже в вашем списке")
 
 async def cmd_remove(message: types.Message):
     """Удалить монету"""
@@ -380,19 +409,16 @@ async def cmd_remove(message: types.Message):
     
     args = message.get_args()
     if not args:
-        await message.answer("Используйте: /remove СИМВОЛ\n\nПример: /remove BTCUSDT")
+        await safe_answer(message, "Используйте: /remove СИМВОЛ\n\nПример: /remove BTCUSDT")
         return
     
-    pair = args.upper()
-    if not pair.endswith("USDT"):
-        pair = f"{pair}USDT"
-    
+    pair = _normalize_pair(args)
     success = await remove_tracked_pair(user_id, pair)
     if success:
-        await message.answer(f"✅ Удалено: {pair}")
+        await safe_answer(message, f"✅ Удалено: {pair}")
         logger.info(f"➖ User {user_id} removed pair: {pair}")
     else:
-        await message.answer(f"⚠️ {pair} не найдено в вашем списке")
+        await safe_answer(message, f"⚠️ {pair} не найдено в вашем списке")
 
 async def cmd_list(message: types.Message):
     """Список монет"""
@@ -407,30 +433,33 @@ async def cmd_list(message: types.Message):
     else:
         text = "📊 У вас нет отслеживаемых монет\n\nИспользуйте /add"
     
-    await message.answer(text)
+    await safe_answer(message, text)
 
 async def cmd_help(message: types.Message):
     """Справка"""
-    text = (
-        "📚 <b>Справка</b>\n\n"
-        "<b>Основные команды:</b>\n"
-        "/start — главное меню\n"
-        "/add СИМВОЛ — добавить монету\n"
-        "/remove СИМВОЛ — удалить монету\n"
-        "/list — список ваших монет\n"
-        "/cancel — отменить действие\n\n"
-        "<b>Оплата:</b>\n"
-        "💳 Через @CryptoBot (USDT)\n"
-        "🎁 Промокоды для бесплатного доступа\n\n"
-        "<b>Поддержка:</b>\n"
-        "💬 Кнопка \"Связь с нами\" в меню"
-    )
-    await message.answer(text)
+    await safe_answer(message, _HELP_TEXT)
 
 # ============================================================
 # РЕГИСТРАЦИЯ ХЕНДЛЕРОВ
 # ============================================================
 
+# Коллбэки с точным совпадением callback_data
+_CALLBACKS = {
+    "subscribe": callback_subscribe,
+    "promo": callback_promo,
+    "support": callback_support,
+    "back_to_menu": callback_back_to_menu,
+    "my_coins": callback_my_coins,
+}
+
+async def callback_router(callback: types.CallbackQuery):
+    """Единая точка входа для коллбэков: выбор обработчика по callback_data"""
+    handler = _CALLBACKS.get(callback.data)
+    if handler is None and callback.data.startswith("pay_"):
+        handler = callback_payment
+    if handler is not None:
+        await handler(callback)
+
 def setup_handlers(dp):
     """Регистрация всех обработчиков"""
     # Команды
@@ -442,12 +471,7 @@ def setup_handlers(dp):
     dp.register_message_handler(cmd_help, commands=['help'])
     
     # Коллбэки
-    dp.register_callback_query_handler(callback_subscribe, lambda c: c.data == "subscribe")
-    dp.register_callback_query_handler(callback_payment, lambda c: c.data.startswith("pay_"))
-    dp.register_callback_query_handler(callback_promo, lambda c: c.data == "promo")
-    dp.register_callback_query_handler(callback_support, lambda c: c.data == "support")
-    dp.register_callback_query_handler(callback_back_to_menu, lambda c: c.data == "back_to_menu")
-    dp.register_callback_query_handler(callback_my_coins, lambda c: c.data == "my_coins")
+    dp.register_callback_query_handler(callback_router)
     
     # FSM обработчики
     dp.register_message_handler(process_promo, state=PromoState.waiting_for_promo)
@@ -2,48 +2,165 @@
 indicators.py - Базовые индикаторы (упрощённая версия)
 """
 import time
+import asyncio
 import logging
 from typing import Optional, Dict, List, Tuple
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 import httpx
+import numpy as np
+import orjson
 
 logger = logging.getLogger(__name__)
 
+CANDLE_FIELDS = ('t', 'o', 'h', 'l', 'c', 'v')
+
+def _column(index: int) -> property:
+    return property(lambda self: self._buf[index, self._start:self._end])
+
+class CandleSeries:
+    """Свечи одной пары/ТФ в колоночном виде: по np.ndarray на поле
+    
+    Буфер на 2*maxlen свечей: новая пишется в конец, а когда место
+    кончается, последние maxlen один раз переносятся в начало - добавление
+    O(1) в среднем, а поля остаются непрерывными срезами без копий.
+    Срезы действительны до следующего добавления.
+    """
+    __slots__ = ('maxlen', '_buf', '_start', '_end')
+    
+    t, o, h, l, c, v = (_column(i) for i in range(len(CANDLE_FIELDS)))
+    
+    def __init__(self, maxlen: int = 500):
+        self.maxlen = maxlen
+        self._buf = np.empty((len(CANDLE_FIELDS), 2 * maxlen), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+    
+    def __len__(self) -> int:
+        return self._end - self._start
+    
+    def append(self, candle: dict):
+        if self._end == self._buf.shape[1]:
+            size = self._end - self._start
+            self._buf[:, :size] = self._buf[:, self._start:self._end]
+            self._start, self._end = 0, size
+        
+        for i, field in enumerate(CANDLE_FIELDS):
+            self._buf[i, self._end] = candle[field]
+        self._end += 1
+        if self._end - self._start > self.maxlen:
+            self._start += 1
+    
+    def extend(self, rows: np.ndarray):
+        """Добавить пачку свечей: массив (N, 6) в порядке CANDLE_FIELDS"""
+        rows = rows[-self.maxlen:]
+        n = len(rows)
+        if not n:
+            return
+        if self._end + n > self._buf.shape[1]:
+            keep = min(self._end - self._start, self.maxlen - n)
+            self._buf[:, :keep] = self._buf[:, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        
+        self._buf[:, self._end:self._end + n] = rows.T
+        self._end += n
+        if self._end - self._start > self.maxlen:
+            self._start = self._end - self.maxlen
+    
+    def snapshot(self) -> "CandleSeries":
+        """Независимая копия (срезы оригинала меняются при добавлении свечей)"""
+        copy = CandleSeries(self.maxlen)
+        copy.extend(self._buf[:, self._start:self._end].T)
+        return copy
+    
+    def __getstate__(self):
+        # В другой процесс передаём только живое окно, а не весь буфер
+        return self.maxlen, self._buf[:, self._start:self._end]
+    
+    def __setstate__(self, state):
+        maxlen, window = state
+        self.__init__(maxlen)
+        self.extend(window.T)
+
+_EMPTY_SERIES = CandleSeries(0)
+
 class CandleStorage:
-    def __init__(self):
-        self.candles: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+    def __init__(self, maxlen: int = 500):
+        self.maxlen = maxlen
+        self.candles: Dict[str, Dict[str, CandleSeries]] = defaultdict(dict)
     
     def add_candle(self, pair: str, tf: str, candle: dict):
-        self.candles[pair][tf].append(candle)
-        if len(self.candles[pair][tf]) > 500:
-            self.candles[pair][tf] = self.candles[pair][tf][-500:]
+        series = self.candles[pair].get(tf)
+        if series is None:
+            series = self.candles[pair][tf] = CandleSeries(self.maxlen)
+        series.append(candle)
     
-    def get_candles(self, pair: str, tf: str) -> List[dict]:
-        return self.candles[pair].get(tf, [])
+    def add_batch(self, pair: str, tf: str, rows: np.ndarray):
+        series = self.candles[pair].get(tf)
+        if series is None:
+            series = self.candles[pair][tf] = CandleSeries(self.maxlen)
+        series.extend(rows)
+    
+    def get_candles(self, pair: str, tf: str) -> CandleSeries:
+        return self.candles[pair].get(tf, _EMPTY_SERIES)
+    
+    def has_depth(self, pair: str, tf: str, n: int) -> bool:
+        """Есть ли по паре/ТФ хотя бы n свечей (без создания пустых записей)"""
+        series = self.candles.get(pair, {}).get(tf)
+        return series is not None and len(series) >= n
 
 CANDLES = CandleStorage()
 
 class PriceCache:
-    def __init__(self, ttl: int = 30):
-        self.cache = {}
+    """Кэш цен с TTL и ограничением размера (LRU): устаревшие записи
+    удаляются при обращении, а не полным проходом по словарю"""
+    def __init__(self, ttl: int = 30, maxsize: int = 1024):
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
         self.ttl = ttl
+        self.maxsize = maxsize
     
     def get(self, pair: str):
-        if pair in self.cache:
-            price, volume, cached_at = self.cache[pair]
-            if time.time() - cached_at < self.ttl:
-                return price, volume
-        return None
+        entry = self.cache.get(pair)
+        if entry is None:
+            return None
+        price, volume, cached_at = entry
+        if time.time() - cached_at >= self.ttl:
+            del self.cache[pair]
+            return None
+        self.cache.move_to_end(pair)
+        return price, volume
     
     def set(self, pair: str, price: float, volume: float):
         self.cache[pair] = (price, volume, time.time())
-    
-    def clear_old(self):
-        now = time.time()
-        self.cache = {k: v for k, v in self.cache.items() if now - v[2] < self.ttl}
+        self.cache.move_to_end(pair)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
 
 PRICE_CACHE = PriceCache()
 
+# ==================== HTTP CLIENT ====================
+# Один долгоживущий клиент на весь процесс: keep-alive и HTTP/2
+# избавляют от TCP+TLS рукопожатия с Binance на каждый запрос
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Общий httpx-клиент (создаётся при первом обращении)"""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            headers={"Accept-Encoding": "gzip", "User-Agent": "alertbot/9"}
+        )
+    return _CLIENT
+
+async def close_client():
+    """Закрыть общий httpx-клиент"""
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
 # ==================== API FUNCTIONS ====================
 async def fetch_price(client: httpx.AsyncClient, pair: str) -> Optional[Tuple[float, float]]:
     """Получить цену с Binance"""
@@ -55,7 +172,7 @@ async def fetch_price(client: httpx.AsyncClient, pair: str) -> Optional[Tuple[fl
         url = f"https://api.binance.com/api/v3/ticker/24hr?symbol={pair.upper()}"
         resp = await client.get(url, timeout=5.0)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         price = float(data["lastPrice"])
         volume = float(data["volume"])
         
@@ -65,38 +182,71 @@ async def fetch_price(client: httpx.AsyncClient, pair: str) -> Optional[Tuple[fl
         logger.error(f"Error fetching {pair}: {e}")
         return None
 
-async def fetch_candles_binance(pair: str, tf: str, limit: int = 100):
-    """Получение свечей с Binance"""
+async def fetch_prices_batch(client: httpx.AsyncClient, pairs: List[str]) -> Dict[str, Tuple[float, float]]:
+    """Получить цены сразу для нескольких пар одним запросом к Binance"""
+    prices = {}
+    missing = []
+    for pair in pairs:
+        cached = PRICE_CACHE.get(pair)
+        if cached:
+            prices[pair] = cached
+        else:
+            missing.append(pair)
+    
+    if not missing:
+        return prices
+    
     try:
-        async with httpx.AsyncClient() as client:
-            tf_map = {"1h": "1h", "4h": "4h", "1d": "1d"}
-            interval = tf_map.get(tf, "1h")
-            
-            url = f"https://api.binance.com/api/v3/klines"
-            params = {
-                "symbol": pair,
-                "interval": interval,
-                "limit": limit
-            }
-            
-            response = await client.get(url, params=params, timeout=10.0)
-            response.raise_for_status()
-            
-            klines = response.json()
-            candles = []
-            
-            for kline in klines:
-                candle = {
-                    't': kline[0] / 1000,
-                    'o': float(kline[1]),
-                    'h': float(kline[2]),
-                    'l': float(kline[3]),
-                    'c': float(kline[4]),
-                    'v': float(kline[5])
-                }
-                candles.append(candle)
-            
-            return candles
+        url = "https://api.binance.com/api/v3/ticker/24hr"
+        symbols = orjson.dumps([pair.upper() for pair in missing]).decode()
+        resp = await client.get(url, params={"symbols": symbols}, timeout=5.0)
+        resp.raise_for_status()
+        
+        for data in orjson.loads(resp.content):
+            price = float(data["lastPrice"])
+            volume = float(data["volume"])
+            PRICE_CACHE.set(data["symbol"], price, volume)
+            prices[data["symbol"]] = (price, volume)
+    except httpx.HTTPStatusError as e:
+        # Один неизвестный символ отклоняет весь пакет - добираем по одной паре
+        logger.warning(f"Batch ticker request failed ({e}), falling back to per-pair requests")
+        sem = asyncio.Semaphore(20)
+        
+        async def _one(pair: str):
+            async with sem:
+                return pair, await fetch_price(client, pair)
+        
+        for pair, price_data in await asyncio.gather(*[_one(pair) for pair in missing]):
+            if price_data:
+                prices[pair] = price_data
+    except Exception as e:
+        logger.error(f"Error fetching batch prices: {e}")
+    
+    return prices
+
+async def fetch_candles_binance(client: httpx.AsyncClient, pair: str, tf: str,
+                                limit: int = 100) -> Optional[np.ndarray]:
+    """Получение свечей с Binance: массив (N, 6) t,o,h,l,c,v"""
+    try:
+        tf_map = {"1h": "1h", "4h": "4h", "1d": "1d"}
+        interval = tf_map.get(tf, "1h")
+        
+        url = f"https://api.binance.com/api/v3/klines"
+        params = {
+            "symbol": pair,
+            "interval": interval,
+            "limit": limit
+        }
+        
+        response = await client.get(url, params=params, timeout=10.0)
+        response.raise_for_status()
+        
+        klines = orjson.loads(response.content)
+        
+        # Строки цен приводим к float64 одним вызовом NumPy вместо float() на каждое поле
+        candles = np.array([kline[:6] for kline in klines], dtype=np.float64).reshape(-1, len(CANDLE_FIELDS))
+        candles[:, 0] /= 1000
+        return candles
             
     except Exception as e:
         logger.error(f"Error fetching candles {pair} {tf}: {e}")
@@ -108,35 +258,30 @@ def calculate_rsi(closes: List[float], period: int = 14) -> Optional[float]:
     if len(closes) < period + 1:
         return None
     
-    gains = []
-    losses = []
-    for i in range(1, len(closes)):
-        change = closes[i] - closes[i-1]
-        gains.append(max(0, change))
-        losses.append(max(0, -change))
-    
-    if len(gains) < period:
-        return None
-    
-    avg_gain = sum(gains[-period:]) / period
-    avg_loss = sum(losses[-period:]) / period
+    # Нужны только последние period изменений цены
+    deltas = np.diff(np.asarray(closes[-(period + 1):], dtype=np.float64))
+    avg_gain = np.maximum(deltas, 0).mean()
+    avg_loss = np.maximum(-deltas, 0).mean()
     
     if avg_loss == 0:
         return 100.0
     
     rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
+    return float(100 - (100 / (1 + rs)))
 
 def calculate_ema(values: List[float], period: int) -> Optional[float]:
     """Exponential Moving Average"""
     if len(values) < period:
         return None
     
+    # Рекурсия ema = v*k + ema*(1-k), развёрнутая в одно скалярное произведение:
+    # вес i-го значения k*(1-k)^(n-1-i), у первого (затравки) - (1-k)^(n-1)
     k = 2 / (period + 1)
-    ema = values[0]
-    for value in values[1:]:
-        ema = value * k + ema * (1 - k)
-    return ema
+    arr = np.asarray(values, dtype=np.float64)
+    n = len(arr)
+    weights = k * (1 - k) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - k) ** (n - 1)
+    return float(np.dot(weights, arr))
 
 # Совместимость со старым кодом
 def analyze_signal(pair: str) -> Optional[Dict]:
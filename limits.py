@@ -0,0 +1,10 @@
+"""
+limits.py - Общие лимиты отправки сообщений бота
+"""
+from aiolimiter import AsyncLimiter
+
+from config import TELEGRAM_RATE_LIMIT
+
+# Общий лимитер отправки для всего бота (лимит Telegram ~30 сообщений/сек):
+# им пользуются и рассылка сигналов, и ответы в хендлерах
+TELEGRAM_LIMITER = AsyncLimiter(TELEGRAM_RATE_LIMIT, 1)
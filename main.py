@@ -8,8 +8,9 @@ from aiogram.contrib.fsm_storage.memory import MemoryStorage
 
 from config import BOT_TOKEN, TIMEFRAME, CANDLE_SECONDS, CHECK_INTERVAL, SIGNAL_COOLDOWN, MIN_CONFIDENCE_SCORE, MIN_VOLUME_MULTIPLIER, MIN_VOLATILITY
 from handlers import setup_handlers
-from tasks import price_collector, signal_analyzer
-from database import init_db
+from tasks import price_collector, signal_analyzer, shutdown_proc_pool
+from database import init_db, close_db
+from indicators import close_client
 
 logging.basicConfig(
     level=logging.INFO,
@@ -52,6 +53,15 @@ async def main():
         await dp.start_polling()
     finally:
         await bot.close()
+        shutdown_proc_pool()
+        await close_client()
+        await close_db()
 
 if __name__ == '__main__':
+    # uvloop - более быстрый цикл событий на libuv (недоступен на Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
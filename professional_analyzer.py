@@ -4,12 +4,23 @@ professional_analyzer.py - Анализ по ТЗ CryptoMicky Alerts (80%+ Confi
 import logging
 from typing import Dict, List, Optional, Tuple
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from indicators import CandleSeries, calculate_ema, calculate_rsi
 
 logger = logging.getLogger(__name__)
 
 class ProfessionalAnalyzer:
     """Профессиональный анализатор по ТЗ"""
     
+    # Биты условий входа (порядок совпадает с required_conditions)
+    BIT_PRICE = 1   # цена у уровня
+    BIT_LEVEL = 2   # уровень отработал минимум 2 раза
+    BIT_RSI = 4     # разворот RSI
+    BIT_VOL = 8     # объёмы против движения снижаются
+    BIT_BTC = 16    # BTC не против сделки
+    _ALL_CONDITIONS = 0b11111
+    
     def __init__(self):
         self.required_conditions = {
             'LONG': [
@@ -28,13 +39,18 @@ class ProfessionalAnalyzer:
             ]
         }
     
-    def analyze_pair(self, pair: str, candles_1h: List, candles_4h: List, candles_1d: List) -> Optional[Dict]:
-        """Основной анализ по ТЗ"""
+    def analyze_pair(self, pair: str, candles_1h: CandleSeries, candles_4h: CandleSeries,
+                     candles_1d: CandleSeries, btc_trend: str = 'neutral') -> Optional[Dict]:
+        """Основной анализ по ТЗ (тренд BTC считается один раз за цикл снаружи)"""
         try:
             # Проверяем достаточность данных
             if len(candles_1h) < 50 or len(candles_4h) < 50 or len(candles_1d) < 30:
                 return None
             
+            # RSI считаем один раз на пару - нужен обеим сторонам
+            rsi_1h = self._calculate_rsi(candles_1h.c)
+            rsi_4h = self._calculate_rsi(candles_4h.c)
+            
             # Определяем тренд
             trend_4h = self._determine_trend(candles_4h)
             trend_1d = self._determine_trend(candles_1d)
@@ -43,48 +59,51 @@ class ProfessionalAnalyzer:
             supports, resistances = self._find_key_levels(candles_4h)
             
             # Анализируем LONG
-            long_signal = self._analyze_long(pair, candles_1h, candles_4h, trend_4h, trend_1d, supports)
+            long_signal = self._analyze_long(pair, candles_1h, rsi_1h, rsi_4h, trend_4h, trend_1d,
+                                             btc_trend, supports)
             if long_signal:
                 # 🔥 ФИЛЬТР: только сигналы от 80% Confidence
                 if long_signal.get('confidence', 0) >= 80:
                     logger.info(f"📊 {pair} LONG: {long_signal['confidence']}% confidence ✅")
                     return long_signal
-                else:
+                elif logger.isEnabledFor(logging.DEBUG):
                     logger.debug(f"📊 {pair} LONG: {long_signal['confidence']}% confidence ❌ (ниже 80%)")
             
             # Анализируем SHORT
-            short_signal = self._analyze_short(pair, candles_1h, candles_4h, trend_4h, trend_1d, resistances)
+            short_signal = self._analyze_short(pair, candles_1h, rsi_1h, rsi_4h, trend_4h, trend_1d,
+                                               btc_trend, resistances)
             if short_signal:
                 # 🔥 ФИЛЬТР: только сигналы от 80% Confidence
                 if short_signal.get('confidence', 0) >= 80:
                     logger.info(f"📊 {pair} SHORT: {short_signal['confidence']}% confidence ✅")
                     return short_signal
-                else:
+                elif logger.isEnabledFor(logging.DEBUG):
                     logger.debug(f"📊 {pair} SHORT: {short_signal['confidence']}% confidence ❌ (ниже 80%)")
             
-            logger.debug(f"📊 {pair}: No high-confidence signal found")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"📊 {pair}: No high-confidence signal found")
             return None
             
         except Exception as e:
             logger.error(f"Analysis error for {pair}: {e}")
             return None
     
-    def _determine_trend(self, candles: List) -> str:
+    def _determine_trend(self, candles: CandleSeries) -> str:
         """Определение тренда по ТЗ п.3"""
         if len(candles) < 20:
             return 'neutral'
         
-        closes = [c['c'] for c in candles]
-        highs = [c['h'] for c in candles]
-        lows = [c['l'] for c in candles]
+        closes = candles.c
+        highs = candles.h
+        lows = candles.l
         
         # Анализ структуры цены
         recent_highs = highs[-10:]
         recent_lows = lows[-10:]
         
         # Higher highs / lower lows
-        higher_highs = sum(1 for i in range(1, len(recent_highs)) if recent_highs[i] > recent_highs[i-1])
-        lower_lows = sum(1 for i in range(1, len(recent_lows)) if recent_lows[i] < recent_lows[i-1])
+        higher_highs = int(np.count_nonzero(np.diff(recent_highs) > 0))
+        lower_lows = int(np.count_nonzero(np.diff(recent_lows) < 0))
         
         # RSI анализ
         rsi = self._calculate_rsi(closes)
@@ -121,57 +140,60 @@ class ProfessionalAnalyzer:
         else:
             return 'neutral'
     
-    def _find_key_levels(self, candles: List) -> Tuple[List[float], List[float]]:
+    def _find_key_levels(self, candles: CandleSeries) -> Tuple[List[float], List[float]]:
         """Поиск ключевых уровней по ТЗ п.4"""
         if len(candles) < 50:
             return [], []
         
-        highs = [c['h'] for c in candles]
-        lows = [c['l'] for c in candles]
-        closes = [c['c'] for c in candles]
-        volumes = [c['v'] for c in candles]
-        
-        supports = []
-        resistances = []
-        
-        # Ищем уровни поддержки (минимум 2 отскока)
-        for i in range(20, len(candles)-10):
-            current_low = lows[i]
-            
-            # Проверяем был ли это уровень поддержки
-            bounce_count = 0
-            for j in range(max(0, i-30), min(len(candles), i+30)):
-                if abs(lows[j] - current_low) / current_low <= 0.02:  # 2% tolerance
-                    if volumes[j] > np.mean(volumes[max(0, j-5):j]):
-                        bounce_count += 1
-            
-            if bounce_count >= 2 and current_low < closes[-1]:
-                supports.append(current_low)
-        
-        # Ищем уровни сопротивления (минимум 2 отскока)
-        for i in range(20, len(candles)-10):
-            current_high = highs[i]
-            
-            # Проверяем был ли это уровень сопротивления
-            bounce_count = 0
-            for j in range(max(0, i-30), min(len(candles), i+30)):
-                if abs(highs[j] - current_high) / current_high <= 0.02:  # 2% tolerance
-                    if volumes[j] > np.mean(volumes[max(0, j-5):j]):
-                        bounce_count += 1
-            
-            if bounce_count >= 2 and current_high > closes[-1]:
-                resistances.append(current_high)
+        n = len(candles)
+        highs = candles.h
+        lows = candles.l
+        volumes = candles.v
+        current_price = candles.c[-1]
+        
+        # Объём свечи выше среднего за 5 предыдущих: суммы окон считаются
+        # напрямую (без разности префиксных сумм), чтобы совпадать с np.mean
+        # бит в бит; в начале ряда окно короче 5 свечей
+        rolling_mean = np.empty(n - 1)
+        head = min(5, n) - 1
+        rolling_mean[:head] = np.cumsum(volumes[:head]) / np.arange(1, head + 1)
+        rolling_mean[head:] = sliding_window_view(volumes[:-1], 5).sum(axis=1) / 5
+        volume_ok = np.zeros(n, dtype=bool)
+        volume_ok[1:] = volumes[1:] > rolling_mean
+        
+        # Кандидаты в уровни и окно ±30 свечей вокруг каждого
+        # (матрица не больше 500x500 - целиком помещается в кэш)
+        idx = np.arange(20, n - 10)
+        cols = np.arange(n)
+        window = (cols[None, :] >= idx[:, None] - 30) & (cols[None, :] < idx[:, None] + 30)
+        window &= volume_ok[None, :]
+        
+        # Уровни поддержки (минимум 2 отскока)
+        support_touches = self._count_level_touches(lows, idx, window)
+        candidate_lows = lows[idx]
+        supports = candidate_lows[(support_touches >= 2) & (candidate_lows < current_price)].tolist()
+        
+        # Уровни сопротивления (минимум 2 отскока)
+        resistance_touches = self._count_level_touches(highs, idx, window)
+        candidate_highs = highs[idx]
+        resistances = candidate_highs[(resistance_touches >= 2) & (candidate_highs > current_price)].tolist()
         
         # Фильтруем и группируем уровни
-        supports = self._filter_levels(supports, closes[-1])
-        resistances = self._filter_levels(resistances, closes[-1])
+        supports = self._filter_levels(supports, current_price)
+        resistances = self._filter_levels(resistances, current_price)
         
         return supports, resistances
     
-    def _analyze_long(self, pair: str, candles_1h: List, candles_4h: List, 
-                     trend_4h: str, trend_1d: str, supports: List[float]) -> Optional[Dict]:
+    def _count_level_touches(self, prices: np.ndarray, idx: np.ndarray, window: np.ndarray) -> np.ndarray:
+        """Сколько свечей окна касались уровня prices[i] (±2%) для каждого i из idx"""
+        levels = prices[idx][:, None]
+        near = np.abs(prices[None, :] - levels) / levels <= 0.02  # 2% tolerance
+        return (near & window).sum(axis=1)
+    
+    def _analyze_long(self, pair: str, candles_1h: CandleSeries, rsi_1h: Optional[float], rsi_4h: Optional[float],
+                     trend_4h: str, trend_1d: str, btc_trend: str, supports: List[float]) -> Optional[Dict]:
         """Анализ LONG по ТЗ п.5.2"""
-        current_price = candles_1h[-1]['c']
+        current_price = float(candles_1h.c[-1])
         
         # Находим ближайшую поддержку
         best_support = None
@@ -186,39 +208,38 @@ class ProfessionalAnalyzer:
             return None
         
         # Проверяем ВСЕ условия для LONG
-        conditions_met = []
+        mask = 0
         
         # 1. Цена у поддержки (±1.5%)
         price_diff = abs(current_price - best_support) / best_support
         if price_diff <= 0.015:
-            conditions_met.append('price_at_support')
+            mask |= self.BIT_PRICE
         
         # 2. Уровень работал минимум 2 раза (уже в фильтре)
-        conditions_met.append('support_level_works')
+        mask |= self.BIT_LEVEL
         
         # 3. RSI растёт от 30-45
-        rsi_1h = self._calculate_rsi([c['c'] for c in candles_1h])
-        rsi_4h = self._calculate_rsi([c['c'] for c in candles_4h])
         if rsi_1h and rsi_4h and 30 <= rsi_1h <= 45 and rsi_1h > rsi_4h:
-            conditions_met.append('rsi_from_oversold')
+            mask |= self.BIT_RSI
         
         # 4. Объёмы на красных свечах уменьшаются
         if self._check_volume_decrease_on_red(candles_1h):
-            conditions_met.append('volume_decreasing_on_red')
+            mask |= self.BIT_VOL
         
-        # 5. BTC не падает сильно (заглушка - нужно реализовать проверку BTC)
-        conditions_met.append('btc_not_falling')
+        # 5. BTC не падает
+        if btc_trend != 'bearish':
+            mask |= self.BIT_BTC
         
         # Проверяем выполнены ли ВСЕ условия
-        if set(conditions_met) == set(self.required_conditions['LONG']):
-            return self._create_signal('LONG', pair, current_price, best_support, conditions_met)
+        if mask == self._ALL_CONDITIONS:
+            return self._create_signal('LONG', pair, current_price, best_support, mask)
         
         return None
     
-    def _analyze_short(self, pair: str, candles_1h: List, candles_4h: List,
-                      trend_4h: str, trend_1d: str, resistances: List[float]) -> Optional[Dict]:
+    def _analyze_short(self, pair: str, candles_1h: CandleSeries, rsi_1h: Optional[float], rsi_4h: Optional[float],
+                      trend_4h: str, trend_1d: str, btc_trend: str, resistances: List[float]) -> Optional[Dict]:
         """Анализ SHORT по ТЗ п.5.1"""
-        current_price = candles_1h[-1]['c']
+        current_price = float(candles_1h.c[-1])
         
         # Находим ближайшее сопротивление
         best_resistance = None
@@ -233,42 +254,42 @@ class ProfessionalAnalyzer:
             return None
         
         # Проверяем ВСЕ условия для SHORT
-        conditions_met = []
+        mask = 0
         
         # 1. Цена у сопротивления (±1.5%)
         price_diff = abs(current_price - best_resistance) / best_resistance
         if price_diff <= 0.015:
-            conditions_met.append('price_at_resistance')
+            mask |= self.BIT_PRICE
         
         # 2. Уровень работал минимум 2 раза
-        conditions_met.append('resistance_level_works')
+        mask |= self.BIT_LEVEL
         
         # 3. RSI падает сверху вниз
-        rsi_1h = self._calculate_rsi([c['c'] for c in candles_1h])
-        rsi_4h = self._calculate_rsi([c['c'] for c in candles_4h])
         if rsi_1h and rsi_4h and 55 <= rsi_1h <= 70 and rsi_1h < rsi_4h:
-            conditions_met.append('rsi_from_overbought')
+            mask |= self.BIT_RSI
         
         # 4. Объёмы на зелёных свечах уменьшаются
         if self._check_volume_decrease_on_green(candles_1h):
-            conditions_met.append('volume_decreasing_on_green')
+            mask |= self.BIT_VOL
         
-        # 5. BTC не бычий (заглушка)
-        conditions_met.append('btc_not_pumping')
+        # 5. BTC не бычий
+        if btc_trend != 'bullish':
+            mask |= self.BIT_BTC
         
         # Проверяем выполнены ли ВСЕ условия
-        if set(conditions_met) == set(self.required_conditions['SHORT']):
-            return self._create_signal('SHORT', pair, current_price, best_resistance, conditions_met)
+        if mask == self._ALL_CONDITIONS:
+            return self._create_signal('SHORT', pair, current_price, best_resistance, mask)
         
         return None
     
     def _create_signal(self, side: str, pair: str, current_price: float, 
-                      level: float, conditions_met: List[str]) -> Dict:
+                      level: float, mask: int) -> Dict:
         """Создание сигнала по ТЗ"""
+        conditions_count = bin(mask).count('1')
         
         # Confidence score (ТЗ п.10)
-        confidence = len(conditions_met) * 20  # база
-        if len(conditions_met) == 5:  # все условия
+        confidence = conditions_count * 20  # база
+        if conditions_count == 5:  # все условия
             confidence += 10
         confidence = min(confidence, 100)
         
@@ -288,10 +309,10 @@ class ProfessionalAnalyzer:
         tp1, tp2, tp3 = self._calculate_take_profits(side, current_price, level)
         
         # Позиционный sizing (ТЗ п.9)
-        position_size = self._get_position_size(len(conditions_met))
+        position_size = self._get_position_size(conditions_count)
         
         # Форматирование логики
-        logic = self._format_logic(side, conditions_met, level)
+        logic = self._format_logic(side, mask, level)
         
         return {
             'side': side,
@@ -338,16 +359,23 @@ class ProfessionalAnalyzer:
         else:
             return "0% (сигнал не даётся)"
     
-    def _format_logic(self, side: str, conditions: List[str], level: float) -> str:
+    def _conditions_from_mask(self, side: str, mask: int) -> List[str]:
+        """Названия выполненных условий по битовой маске"""
+        return [name for bit, name in enumerate(self.required_conditions[side]) if mask >> bit & 1]
+    
+    def _format_logic(self, side: str, mask: int, level: float) -> str:
         """Форматирование логики для сигнала"""
         base = f"Цена тестирует зону {'поддержки' if side == 'LONG' else 'сопротивления'} {level:.2f}$"
         
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{side} conditions: {self._conditions_from_mask(side, mask)}")
+        
         details = []
-        if 'rsi_from_oversold' in conditions or 'rsi_from_overbought' in conditions:
+        if mask & self.BIT_RSI:
             details.append("RSI показывает разворот")
-        if 'volume_decreasing_on_red' in conditions or 'volume_decreasing_on_green' in conditions:
+        if mask & self.BIT_VOL:
             details.append("объёмы снижаются")
-        if 'btc_not_falling' in conditions or 'btc_not_pumping' in conditions:
+        if mask & self.BIT_BTC:
             details.append("BTC не подтверждает движение")
         
         if details:
@@ -358,58 +386,37 @@ class ProfessionalAnalyzer:
     # Вспомогательные методы
     def _calculate_rsi(self, closes: List[float], period: int = 14) -> Optional[float]:
         """Расчёт RSI"""
-        if len(closes) < period + 1:
-            return None
-        
-        deltas = np.diff(closes)
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        
-        avg_gain = np.mean(gains[-period:])
-        avg_loss = np.mean(losses[-period:])
-        
-        if avg_loss == 0:
-            return 100.0
-        
-        rs = avg_gain / avg_loss
-        return 100 - (100 / (1 + rs))
+        return calculate_rsi(closes, period)
     
     def _calculate_ema(self, values: List[float], period: int) -> Optional[float]:
         """Расчёт EMA"""
-        if len(values) < period:
-            return None
-        
-        k = 2 / (period + 1)
-        ema = values[0]
-        for value in values[1:]:
-            ema = value * k + ema * (1 - k)
-        return ema
+        return calculate_ema(values, period)
     
-    def _check_volume_decrease_on_red(self, candles: List) -> bool:
+    def _check_volume_decrease_on_red(self, candles: CandleSeries) -> bool:
         """Проверка уменьшения объёмов на красных свечах"""
         if len(candles) < 10:
             return False
         
-        red_candles = [c for c in candles[-5:] if c['c'] < c['o']]
-        if len(red_candles) < 2:
+        red = candles.c[-5:] < candles.o[-5:]
+        if red.sum() < 2:
             return False
         
         # Проверяем тренд объёмов
-        volumes = [c['v'] for c in red_candles]
-        return volumes[-1] < volumes[0]
+        volumes = candles.v[-5:][red]
+        return bool(volumes[-1] < volumes[0])
     
-    def _check_volume_decrease_on_green(self, candles: List) -> bool:
+    def _check_volume_decrease_on_green(self, candles: CandleSeries) -> bool:
         """Проверка уменьшения объёмов на зелёных свечах"""
         if len(candles) < 10:
             return False
         
-        green_candles = [c for c in candles[-5:] if c['c'] > c['o']]
-        if len(green_candles) < 2:
+        green = candles.c[-5:] > candles.o[-5:]
+        if green.sum() < 2:
             return False
         
         # Проверяем тренд объёмов
-        volumes = [c['v'] for c in green_candles]
-        return volumes[-1] < volumes[0]
+        volumes = candles.v[-5:][green]
+        return bool(volumes[-1] < volumes[0])
     
     def _filter_levels(self, levels: List[float], current_price: float) -> List[float]:
         """Фильтрация уровней"""
@@ -417,24 +424,27 @@ class ProfessionalAnalyzer:
             return []
         
         # Убираем уровни слишком далеко от цены
-        filtered = [l for l in levels if abs(l - current_price) / current_price <= 0.1]
-        
-        # Группируем близкие уровни
-        filtered.sort()
-        grouped = []
-        current_group = [filtered[0]]
-        
-        for level in filtered[1:]:
-            if abs(level - current_group[0]) / current_group[0] <= 0.02:  # 2%
-                current_group.append(level)
-            else:
-                grouped.append(np.mean(current_group))
-                current_group = [level]
-        
-        if current_group:
-            grouped.append(np.mean(current_group))
+        arr = np.sort(np.asarray(levels, dtype=np.float64))
+        arr = arr[np.abs(arr - current_price) / current_price <= 0.1]
+        if not len(arr):
+            return []
         
-        return grouped
+        # Группируем близкие уровни: группа - всё в пределах 2% от её первого уровня.
+        # Начало следующей группы находим бинарным поиском, средние - одним reduceat
+        starts = []
+        i = 0
+        while i < len(arr):
+            starts.append(i)
+            i = int(np.searchsorted(arr, arr[i] * 1.02, side='right'))
+        
+        sums = np.add.reduceat(arr, starts)
+        counts = np.diff(np.append(starts, len(arr)))
+        return (sums / counts).tolist()
 
 # Глобальный экземпляр анализатора
 professional_analyzer = ProfessionalAnalyzer()
+
+def analyze_pair_in_worker(pair: str, candles_1h: CandleSeries, candles_4h: CandleSeries,
+                           candles_1d: CandleSeries, btc_trend: str) -> Optional[Dict]:
+    """Точка входа для процесса-воркера: анализ пары глобальным анализатором"""
+    return professional_analyzer.analyze_pair(pair, candles_1h, candles_4h, candles_1d, btc_trend)
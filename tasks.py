@@ -2,96 +2,231 @@
 tasks.py - Фоновые задачи с антиспамом и упрощённым форматом
 """
 import time
+import heapq
 import asyncio
 import logging
-from collections import defaultdict
-import httpx
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from aiogram import Bot
 from aiogram.utils.exceptions import RetryAfter, TelegramAPIError
 
 from config import (
-    CHECK_INTERVAL, DEFAULT_PAIRS, TIMEFRAME,
-    MAX_SIGNALS_PER_DAY, BATCH_SEND_SIZE, BATCH_SEND_DELAY,
-    SIGNAL_COOLDOWN
+    CHECK_INTERVAL, DEFAULT_PAIRS, SIGNAL_COOLDOWN,
+    ANALYZER_CONCURRENCY, SEND_CONCURRENCY,
+    ANALYZER_WORKERS, MIN_DEPTH, HISTORY_DEPTH
 )
-from database import (
-    get_all_tracked_pairs, get_pairs_with_users,
-    count_signals_today, log_signal, get_all_user_ids
-)
-from indicators import CANDLES, fetch_price, fetch_candles_binance
-from professional_analyzer import ProfessionalAnalyzer
+from database import get_all_tracked_pairs, get_pairs_with_users, get_last_signal_times, log_signals
+from limits import TELEGRAM_LIMITER
+from indicators import CANDLES, fetch_prices_batch, fetch_candles_binance, get_client
+from professional_analyzer import ProfessionalAnalyzer, analyze_pair_in_worker
 
 logger = logging.getLogger(__name__)
 
 # Создаём экземпляр анализатора
 crypto_micky_analyzer = ProfessionalAnalyzer()
 
-LAST_SIGNALS = {}
+# Пары, которые собираются всегда (BTC нужен для тренда рынка; без дублей,
+# иначе свечи пары добавятся дважды)
+_BASE_PAIRS = frozenset(DEFAULT_PAIRS) | {"BTCUSDT"}
+
+# Пул процессов для анализа: расчёты индикаторов не блокируют event loop
+_PROC_POOL: Optional[ProcessPoolExecutor] = None
+
+def get_proc_pool() -> ProcessPoolExecutor:
+    """Пул процессов анализатора (создаётся при первом обращении)"""
+    global _PROC_POOL
+    if _PROC_POOL is None:
+        # forkserver: воркеры не наследуют потоки aiosqlite/клиента через fork
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("forkserver")
+        else:
+            ctx = None
+        _PROC_POOL = ProcessPoolExecutor(max_workers=ANALYZER_WORKERS, mp_context=ctx)
+    return _PROC_POOL
+
+def shutdown_proc_pool():
+    """Остановить пул процессов анализатора"""
+    global _PROC_POOL
+    if _PROC_POOL is not None:
+        _PROC_POOL.shutdown(wait=False, cancel_futures=True)
+        _PROC_POOL = None
+
+# Время последней 1h свечи, на которой анализировалась пара
+_LAST_ANALYZED: Dict[str, float] = {}
+
+# Пары на cooldown после сигнала (по time.monotonic - не зависит от перевода часов):
+# словарь {пара: время окончания} для проверки и куча (время окончания, пара) для снятия истёкших
+_COOLDOWN_HEAP: List[Tuple[float, str]] = []
+_COOLDOWN_UNTIL: Dict[str, float] = {}
+
+def _start_cooldown(pair: str, now: float):
+    """Поставить пару на cooldown после сигнала"""
+    until = now + SIGNAL_COOLDOWN
+    heapq.heappush(_COOLDOWN_HEAP, (until, pair))
+    _COOLDOWN_UNTIL[pair] = until
+
+async def _restore_cooldowns():
+    """Восстановить cooldown после перезапуска по истории сигналов в БД"""
+    last_times = await get_last_signal_times(SIGNAL_COOLDOWN)
+    wall_now, now = time.time(), time.monotonic()
+    for pair, sent_at in last_times.items():
+        # Переводим оставшееся время с настенных часов на monotonic
+        _start_cooldown(pair, now - (wall_now - sent_at))
+    if last_times:
+        logger.info("⏳ Restored cooldown for %d pairs", len(last_times))
+
+def _expire_cooldowns(now: float):
+    """Снять cooldown с пар, у которых он истёк"""
+    while _COOLDOWN_HEAP and _COOLDOWN_HEAP[0][0] <= now:
+        until, pair = heapq.heappop(_COOLDOWN_HEAP)
+        # Устаревшая запись кучи не снимает более поздний cooldown той же пары
+        if _COOLDOWN_UNTIL.get(pair) == until:
+            del _COOLDOWN_UNTIL[pair]
+
+# До этого момента (time.monotonic) все отправки ждут после RetryAfter
+_BACKOFF_UNTIL = 0.0
+# Сколько раз пробуем отправить сообщение при RetryAfter
+SEND_RETRIES = 5
 
 async def send_message_safe(bot: Bot, user_id: int, text: str, **kwargs):
-    """Безопасная отправка с обработкой rate limit"""
-    try:
-        await bot.send_message(user_id, text, **kwargs)
-        return True
-    except RetryAfter as e:
-        await asyncio.sleep(e.timeout)
-        return await send_message_safe(bot, user_id, text, **kwargs)
-    except TelegramAPIError:
-        return False
+    """Безопасная отправка с обработкой rate limit (не больше SEND_RETRIES попыток)"""
+    global _BACKOFF_UNTIL
+    for _ in range(SEND_RETRIES):
+        delay = _BACKOFF_UNTIL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            async with TELEGRAM_LIMITER:
+                await bot.send_message(user_id, text, **kwargs)
+            return True
+        except RetryAfter as e:
+            # Лимит общий на бота - притормаживаем сразу все параллельные отправки,
+            # ожидание выполнится в начале следующей попытки
+            _BACKOFF_UNTIL = max(_BACKOFF_UNTIL, time.monotonic() + e.timeout + 0.1)
+        except TelegramAPIError:
+            return False
+    
+    logger.warning("Giving up on message to %s after %d rate-limited attempts", user_id, SEND_RETRIES)
+    return False
 
 async def price_collector(bot: Bot):
     """Сбор рыночных данных для всех ТФ"""
     logger.info("🔄 CryptoMicky Price Collector started (1H, 4H, 1D)")
     
+    # Один клиент на загрузку истории и цикл цен: keep-alive + HTTP/2
+    client = get_client()
+    
     logger.info("📥 Loading historical data for all timeframes...")
-    for pair in DEFAULT_PAIRS:
-        for tf in ["1h", "4h", "1d"]:
+    sem = asyncio.Semaphore(5)
+    
+    async def _load(pair: str, tf: str):
+        async with sem:
             try:
-                candles = await fetch_candles_binance(pair, tf, 100)
-                if candles:
-                    for candle in candles:
-                        CANDLES.add_candle(pair, tf, candle)
-                    logger.info(f"✅ Loaded {len(candles)} candles for {pair} {tf}")
-                await asyncio.sleep(0.3)
+                candles = await fetch_candles_binance(client, pair, tf, HISTORY_DEPTH[tf])
+                if candles is not None and len(candles):
+                    CANDLES.add_batch(pair, tf, candles)
+                    logger.info("✅ Loaded %d candles for %s %s", len(candles), pair, tf)
             except Exception as e:
-                logger.error(f"Error loading {pair} {tf}: {e}")
+                logger.error("Error loading %s %s: %s", pair, tf, e)
+            # Пауза внутри семафора - не больше ~100 запросов/сек к Binance
+            await asyncio.sleep(0.05)
     
-    logger.info("📥 Loading BTC data...")
-    for tf in ["1h", "4h", "1d"]:
-        try:
-            candles = await fetch_candles_binance("BTCUSDT", tf, 100)
-            if candles:
-                for candle in candles:
-                    CANDLES.add_candle("BTCUSDT", tf, candle)
-                logger.info(f"✅ Loaded {len(candles)} BTC candles {tf}")
-            await asyncio.sleep(0.3)
-        except Exception as e:
-            logger.error(f"Error loading BTCUSDT {tf}: {e}")
+    await asyncio.gather(*[_load(pair, tf) for pair in _BASE_PAIRS for tf in HISTORY_DEPTH])
     
     logger.info("✅ Historical data loaded for all timeframes!")
     
-    async with httpx.AsyncClient() as client:
-        while True:
-            try:
-                pairs = await get_all_tracked_pairs()
-                pairs = list(set(pairs + DEFAULT_PAIRS + ["BTCUSDT"]))
-                
-                ts = time.time()
-                for pair in pairs:
-                    price_data = await fetch_price(client, pair)
-                    if price_data:
-                        price, volume = price_data
-                        CANDLES.add_candle(pair, "1h", {
-                            't': ts, 'o': price, 'h': price, 
-                            'l': price, 'c': price, 'v': volume
-                        })
-                
-                logger.info(f"📊 Prices updated for {len(pairs)} pairs")
-                await asyncio.sleep(CHECK_INTERVAL)
-                
-            except Exception as e:
-                logger.error(f"Price collector error: {e}")
-                await asyncio.sleep(60)
+    while True:
+        try:
+            pairs = list(_BASE_PAIRS.union(await get_all_tracked_pairs()))
+            
+            ts = time.time()
+            prices = await fetch_prices_batch(client, pairs)
+            for pair, (price, volume) in prices.items():
+                CANDLES.add_candle(pair, "1h", {
+                    't': ts, 'o': price, 'h': price, 
+                    'l': price, 'c': price, 'v': volume
+                })
+            
+            logger.info("📊 Prices updated for %d pairs", len(pairs))
+            await asyncio.sleep(CHECK_INTERVAL)
+            
+        except Exception as e:
+            logger.error("Price collector error: %s", e)
+            await asyncio.sleep(60)
+
+async def _send_one(bot: Bot, user_id: int, text: str, signal: dict, pair: str,
+                    send_sem: asyncio.Semaphore) -> Optional[tuple]:
+    """Отправка сигнала одному пользователю: строка для истории или None"""
+    # Ошибка одного получателя не должна срывать запись истории и cooldown для остальных
+    try:
+        async with send_sem:
+            sent = await send_message_safe(bot, user_id, text)
+    except Exception as e:
+        logger.error("Failed to send %s signal to %s: %s", pair, user_id, e)
+        return None
+    if not sent:
+        return None
+    return (user_id, pair, signal['side'], signal['current_price'], signal['confidence'])
+
+async def _process_pair(bot: Bot, pair: str, users, now: float, btc_trend: str,
+                        sem: asyncio.Semaphore, send_sem: asyncio.Semaphore) -> bool:
+    """Анализ одной пары и рассылка сигнала подписчикам"""
+    async with sem:
+        until = _COOLDOWN_UNTIL.get(pair)
+        if until is not None:
+            logger.debug("⏳ %s: Cooldown active (%dm left)", pair, int((until - now) / 60))
+            return False
+        
+        if not all(CANDLES.has_depth(pair, tf, depth) for tf, depth in MIN_DEPTH.items()):
+            logger.debug("⚠️ %s: Not enough candles for analysis", pair)
+            return False
+        
+        candles_1h = CANDLES.get_candles(pair, "1h")
+        candles_4h = CANDLES.get_candles(pair, "4h")
+        candles_1d = CANDLES.get_candles(pair, "1d")
+        
+        # Новых свечей с прошлого анализа не было - результат тот же
+        last_ts = float(candles_1h.t[-1])
+        if _LAST_ANALYZED.get(pair) == last_ts:
+            return False
+        
+        # В пул уходят копии: срезы хранилища меняются, пока задача ждёт в очереди
+        loop = asyncio.get_running_loop()
+        try:
+            signal = await loop.run_in_executor(
+                get_proc_pool(), analyze_pair_in_worker,
+                pair, candles_1h.snapshot(), candles_4h.snapshot(), candles_1d.snapshot(), btc_trend
+            )
+        except BrokenProcessPool:
+            # Воркер упал - пул непригоден, при следующем обращении создастся новый
+            logger.error("❌ %s: analyzer process pool broken, restarting", pair)
+            shutdown_proc_pool()
+            return False
+        
+        # Свеча помечается только после успешного анализа;
+        # после сигнала и cooldown пара снова анализируется, даже без новых свечей
+        if not signal:
+            _LAST_ANALYZED[pair] = last_ts
+            return False
+        
+        logger.info("🎯 FOUND SIGNAL: %s %s (%s%%)", pair, signal['side'], signal['confidence'])
+        
+        signal['_fmt'] = _signal_fmt_fields(signal)
+        text = _format_signal(signal)
+        
+        results = await asyncio.gather(
+            *[_send_one(bot, user_id, text, signal, pair, send_sem) for user_id in users]
+        )
+        sent_rows = [row for row in results if row]
+        await log_signals(sent_rows)
+        sent_count = len(sent_rows)
+        
+        logger.info("📤 %s: Sent to %d/%d users", pair, sent_count, len(users))
+        _start_cooldown(pair, now)
+        return True
 
 async def signal_analyzer(bot: Bot):
     """Анализ и отправка сигналов по ТЗ CryptoMicky"""
@@ -104,80 +239,73 @@ async def signal_analyzer(bot: Bot):
         candles_1h = CANDLES.get_candles(pair, "1h")
         candles_4h = CANDLES.get_candles(pair, "4h")
         candles_1d = CANDLES.get_candles(pair, "1d")
-        logger.info(f"📊 {pair} - 1H: {len(candles_1h)}, 4H: {len(candles_4h)}, 1D: {len(candles_1d)}")
+        logger.info("📊 %s - 1H: %d, 4H: %d, 1D: %d", pair, len(candles_1h), len(candles_4h), len(candles_1d))
     
     btc_1h = CANDLES.get_candles("BTCUSDT", "1h")
-    logger.info(f"📊 BTCUSDT - 1H: {len(btc_1h)}")
+    logger.info("📊 BTCUSDT - 1H: %d", len(btc_1h))
+    
+    try:
+        await _restore_cooldowns()
+    except Exception as e:
+        logger.error("Failed to restore cooldowns: %s", e)
     
     while True:
         try:
-            rows = await get_pairs_with_users()
-            active_pairs = list(set([row["pair"] for row in rows]))
+            users_by_pair = await get_pairs_with_users()
+            active_pairs = list(users_by_pair)
             
-            logger.info(f"🔍 Analyzing {len(active_pairs)} user pairs: {active_pairs}")
+            logger.info("🔍 Analyzing %d user pairs: %s", len(active_pairs), active_pairs)
             
             if not active_pairs:
                 logger.warning("⚠️ No users with active pairs. Users need to add coins via /start")
                 await asyncio.sleep(60)
                 continue
             
-            analyzed = 0
-            signals_found = 0
-            current_time = time.time()
+            now = time.monotonic()
+            _expire_cooldowns(now)
+            sem = asyncio.Semaphore(ANALYZER_CONCURRENCY)
+            send_sem = asyncio.Semaphore(SEND_CONCURRENCY)
             
-            for pair in active_pairs:
-                analyzed += 1
-                
-                if pair in LAST_SIGNALS:
-                    time_since_last = current_time - LAST_SIGNALS[pair]
-                    if time_since_last < SIGNAL_COOLDOWN:
-                        cooldown_left = int((SIGNAL_COOLDOWN - time_since_last) / 60)
-                        logger.debug(f"⏳ {pair}: Cooldown active ({cooldown_left}m left)")
-                        continue
-                
-                candles_1h = CANDLES.get_candles(pair, "1h")
-                candles_4h = CANDLES.get_candles(pair, "4h") 
-                candles_1d = CANDLES.get_candles(pair, "1d")
-                btc_candles_1h = CANDLES.get_candles("BTCUSDT", "1h")
-                
-                if len(candles_1h) < 100 or len(candles_4h) < 50 or len(candles_1d) < 30:
-                    logger.debug(f"⚠️ {pair}: Not enough candles for analysis")
-                    continue
-                
-                signal = crypto_micky_analyzer.analyze_pair(
-                    pair, candles_1h, candles_4h, candles_1d, btc_candles_1h
-                )
-                
-                if signal:
+            # Тренд BTC общий для всех пар - считаем один раз за цикл
+            btc_trend = crypto_micky_analyzer._determine_trend(CANDLES.get_candles("BTCUSDT", "1h"))
+            logger.info("₿ BTC trend: %s", btc_trend)
+            
+            results = await asyncio.gather(
+                *[_process_pair(bot, pair, users_by_pair[pair], now, btc_trend, sem, send_sem)
+                  for pair in active_pairs],
+                return_exceptions=True
+            )
+            
+            analyzed = len(active_pairs)
+            signals_found = 0
+            for pair, result in zip(active_pairs, results):
+                if isinstance(result, Exception):
+                    logger.error("Signal analyzer error for %s: %s", pair, result)
+                elif result:
                     signals_found += 1
-                    logger.info(f"🎯 FOUND SIGNAL: {pair} {signal['side']} ({signal['confidence']}%)")
-                    
-                    users = [row["user_id"] for row in rows if row["pair"] == pair]
-                    text = _format_signal(signal)
-                    
-                    sent_count = 0
-                    for user_id in users:
-                        if await send_message_safe(bot, user_id, text):
-                            await log_signal(
-                                user_id, pair, signal['side'], 
-                                signal['current_price'], signal['confidence']
-                            )
-                            sent_count += 1
-                        await asyncio.sleep(0.05)
-                    
-                    logger.info(f"📤 Sent to {sent_count}/{len(users)} users")
-                    LAST_SIGNALS[pair] = current_time
             
-            logger.info(f"📊 Cycle: {analyzed} pairs analyzed, {signals_found} signals found")
+            logger.info("📊 Cycle: %d pairs analyzed, %d signals found", analyzed, signals_found)
             
             if signals_found == 0:
                 logger.info("💤 No high-confidence signals this cycle (60%+ required)")
                 
         except Exception as e:
-            logger.error(f"Signal analyzer error: {e}")
+            logger.error("Signal analyzer error: %s", e)
         
         await asyncio.sleep(60)
 
+# Правила для строк логики: (ключевые слова, (строка для LONG, строка для SHORT)).
+# Проверяются по порядку, срабатывает первое совпадение
+_COND_RULES = (
+    (('поддержки', 'support'), ("• ✅ Уровень поддержки\n",) * 2),
+    (('сопротивления', 'resistance'), ("• ✅ Уровень сопротивления\n",) * 2),
+    (('rsi',), ("• 📈 RSI бычий\n", "• 📉 RSI медвежий\n")),
+    (('объём', 'volume'), ("• 💰 Объёмы подтверждают\n",) * 2),
+    (('btc',), ("• 🔥 BTC поддерживает\n",) * 2),
+    (('тренд', 'trend'), ("• 📈 Бычий тренд\n", "• 📉 Медвежий тренд\n")),
+    (('работал', 'раз'), ("• ✅ Проверенный уровень\n",) * 2),
+)
+
 def _format_signal(signal: dict) -> str:
     """
     Форматирование сигнала - упрощённый формат
@@ -186,73 +314,75 @@ def _format_signal(signal: dict) -> str:
     - Confidence: HIGH (90%+) / MEDIUM (80-89%) / LOW (70-79%)
     - Цели БЕЗ процентов
     """
+    fmt = signal.get('_fmt') or _signal_fmt_fields(signal)
     
-    side_emoji = "🟢" if signal['side'] == 'LONG' else "🔴"
-    
-    # Заголовок
-    text = f"{side_emoji} <b>{signal['pair']} — {signal['side']}</b>\n\n"
-    
-    # Логика с эмодзи
-    text += f"<b>Логика:</b>\n"
-    
-    conditions = signal.get('conditions_desc', [])
-    if conditions:
-        for condition in conditions[:4]:
-            if 'поддержки' in condition.lower() or 'support' in condition.lower():
-                text += f"• ✅ Уровень поддержки\n"
-            elif 'сопротивления' in condition.lower() or 'resistance' in condition.lower():
-                text += f"• ✅ Уровень сопротивления\n"
-            elif 'rsi' in condition.lower():
-                if signal['side'] == 'LONG':
-                    text += f"• 📈 RSI бычий\n"
-                else:
-                    text += f"• 📉 RSI медвежий\n"
-            elif 'объём' in condition.lower() or 'volume' in condition.lower():
-                text += f"• 💰 Объёмы подтверждают\n"
-            elif 'btc' in condition.lower():
-                text += f"• 🔥 BTC поддерживает\n"
-            elif 'тренд' in condition.lower() or 'trend' in condition.lower():
-                if signal['side'] == 'LONG':
-                    text += f"• 📈 Бычий тренд\n"
-                else:
-                    text += f"• 📉 Медвежий тренд\n"
-            elif 'работал' in condition.lower() or 'раз' in condition.lower():
-                text += f"• ✅ Проверенный уровень\n"
-    else:
-        text += f"• ✅ Уровень {'поддержки' if signal['side'] == 'LONG' else 'сопротивления'}\n"
-        text += f"• 📈 {'Бычий' if signal['side'] == 'LONG' else 'Медвежий'} тренд\n"
-        text += f"• 💰 Объёмы подтверждают\n"
-    
-    text += "\n"
-    
-    # Зона входа
+    # Ключ - только поля, которые попадают в текст: одинаковый сигнал
+    # после cooldown берёт готовую строку из кэша
+    return _render_signal(
+        signal['pair'], signal['side'], fmt['entry_min'], fmt['entry_max'],
+        fmt['tp1'], fmt['tp2'], fmt['tp3'], fmt['sl'],
+        signal['position_size'], fmt['level'],
+        tuple(signal.get('conditions_desc', ())[:4])
+    )
+
+def _signal_fmt_fields(signal: dict) -> dict:
+    """Отформатированные числовые поля сигнала (считаются один раз на сигнал)"""
     entry_min, entry_max = signal['entry_zone']
-    text += f"🎯 <b>Вход:</b> {entry_min:.2f} - {entry_max:.2f}\n"
-    
-    # Цели БЕЗ процентов
-    text += f"🎯 <b>Цели:</b>\n"
-    text += f"TP1: {signal['take_profit_1']:.2f}\n"
-    text += f"TP2: {signal['take_profit_2']:.2f}\n"
-    text += f"TP3: {signal['take_profit_3']:.2f}\n"
-    
-    # Стоп-лосс БЕЗ процентов
-    text += f"🛡 <b>Стоп:</b> {signal['stop_loss']:.2f}\n\n"
-    
-    # Объём позиции
-    text += f"💰 <b>Объём позиции:</b> {signal['position_size']}\n"
-    
-    # Confidence: HIGH (90%+) / MEDIUM (80-89%) / LOW (70-79%)
-    confidence_pct = signal['confidence']
+    return {
+        'entry_min': f"{entry_min:.2f}",
+        'entry_max': f"{entry_max:.2f}",
+        'tp1': f"{signal['take_profit_1']:.2f}",
+        'tp2': f"{signal['take_profit_2']:.2f}",
+        'tp3': f"{signal['take_profit_3']:.2f}",
+        'sl': f"{signal['stop_loss']:.2f}",
+        'level': _confidence_level(signal['confidence']),
+    }
+
+def _confidence_level(confidence_pct: int) -> str:
+    """Confidence: HIGH (90%+) / MEDIUM (80-89%) / LOW (70-79%)"""
     if confidence_pct >= 90:
-        confidence_level = "HIGH"
+        return "HIGH"
     elif confidence_pct >= 80:
-        confidence_level = "MEDIUM"
-    else:
-        confidence_level = "LOW"
+        return "MEDIUM"
+    return "LOW"
+
+@lru_cache(maxsize=512)
+def _render_signal(pair: str, side: str, entry_min: str, entry_max: str,
+                   tp1: str, tp2: str, tp3: str, stop_loss: str,
+                   position_size: str, confidence_level: str, conditions: tuple) -> str:
+    """Сборка текста сигнала"""
+    side_emoji = "🟢" if side == 'LONG' else "🔴"
+    
+    # Заголовок и логика с эмодзи
+    parts = [
+        f"{side_emoji} <b>{pair} — {side}</b>\n\n",
+        "<b>Логика:</b>\n",
+    ]
     
-    text += f"📊 <b>Confidence:</b> {confidence_level}\n\n"
+    if conditions:
+        for condition in conditions:
+            condition_low = condition.lower()
+            for keywords, lines in _COND_RULES:
+                if any(keyword in condition_low for keyword in keywords):
+                    parts.append(lines[side == 'SHORT'])
+                    break
+    else:
+        parts.append(f"• ✅ Уровень {'поддержки' if side == 'LONG' else 'сопротивления'}\n")
+        parts.append(f"• 📈 {'Бычий' if side == 'LONG' else 'Медвежий'} тренд\n")
+        parts.append("• 💰 Объёмы подтверждают\n")
     
-    # БЕЗ времени, только дисклеймер
-    text += f"⚠️ <i>Не финансовый совет</i>"
+    # Вход, цели и стоп БЕЗ процентов, объём позиции, confidence и дисклеймер (БЕЗ времени)
+    parts.append(
+        f"\n"
+        f"🎯 <b>Вход:</b> {entry_min} - {entry_max}\n"
+        f"🎯 <b>Цели:</b>\n"
+        f"TP1: {tp1}\n"
+        f"TP2: {tp2}\n"
+        f"TP3: {tp3}\n"
+        f"🛡 <b>Стоп:</b> {stop_loss}\n\n"
+        f"💰 <b>Объём позиции:</b> {position_size}\n"
+        f"📊 <b>Confidence:</b> {confidence_level}\n\n"
+        f"⚠️ <i>Не финансовый совет</i>"
+    )
     
-    return text
+    return "".join(parts)